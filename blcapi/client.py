@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import enum
-import json
 import logging
 from typing import *
 
 import aiohttp
+import orjson
 
 from . import handlers
 
@@ -14,10 +14,47 @@ __all__ = (
     'RoomKey',
     'Command',
     'BlivechatClient',
+    'close_shared_session',
 )
 
 logger = logging.getLogger('blcapi')
 
+# 所有客户端共用的编解码函数。orjson没有需要预先编译的编解码器对象，绑定到模块级变量省去每次的属性查找
+_loads = orjson.loads
+_dumps = orjson.dumps
+
+_shared_session: aiohttp.ClientSession | None = None
+"""没有指定session的客户端共用的连接池"""
+_shared_session_loop: asyncio.AbstractEventLoop | None = None
+"""创建_shared_session的事件循环，连接池只能在这个事件循环里使用"""
+
+
+def _get_shared_session() -> aiohttp.ClientSession:
+    """获取共用的连接池，必须在事件循环里调用"""
+    global _shared_session, _shared_session_loop
+    loop = asyncio.get_running_loop()
+    if (
+        _shared_session is None
+        or _shared_session.closed
+        # 上次的事件循环没有调用close_shared_session，旧的连接池已经不能用了
+        or _shared_session_loop is not loop
+    ):
+        _shared_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        _shared_session_loop = loop
+    return _shared_session
+
+
+async def close_shared_session():
+    """关闭客户端共用的连接池，应该在所有客户端停止后调用"""
+    global _shared_session, _shared_session_loop
+    if _shared_session is not None and _shared_session_loop is asyncio.get_running_loop():
+        await _shared_session.close()
+    _shared_session = None
+    _shared_session_loop = None
+
 
 class RoomKeyType(enum.IntEnum):
     ROOM_ID = 1
@@ -50,6 +87,16 @@ class Command(enum.IntEnum):
     FATAL_ERROR = 8
 
 
+_WS_CLOSE_MSG_TYPES = frozenset((aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED))
+"""表示连接已关闭的WebSocket消息类型，和aiohttp异步迭代器停止的条件一样"""
+
+# 热点路径里和普通int比较，比和IntEnum比较快
+_FATAL_ERROR_INT = int(Command.FATAL_ERROR)
+
+_HEARTBEAT_BYTES = _dumps({'cmd': int(Command.HEARTBEAT), 'data': {}})
+"""心跳包内容是固定的，预先序列化"""
+
+
 class FatalError(Exception):
     """致命错误，无法重连了"""
     def __init__(self, type_, msg):
@@ -63,7 +110,7 @@ class BlivechatClient:
 
     :param ws_url: blivechat消息转发服务WebSocket地址
     :param room_key: 要连接的房间
-    :param session: 连接池
+    :param session: 连接池，如果为None则使用共用的连接池。必须在运行本客户端的事件循环里创建
     :param heartbeat_interval: 发送心跳包的间隔时间（秒）
     """
 
@@ -78,15 +125,12 @@ class BlivechatClient:
         self._ws_url = ws_url
         self._room_key = room_key
 
-        if session is None:
-            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
-            self._own_session = True
-        else:
-            self._session = session
-            self._own_session = False
-            assert self._session.loop is asyncio.get_event_loop()  # noqa
+        self._session = session
+        """如果为None则在连接时获取共用的连接池"""
 
         self._heartbeat_interval = heartbeat_interval
+        self._join_room_bytes = self._make_join_room_bytes()
+        """预先序列化的加入房间消息"""
 
         self._handler: handlers.HandlerInterface | None = None
         """消息处理器"""
@@ -98,6 +142,10 @@ class BlivechatClient:
         """网络协程的future"""
         self._heartbeat_timer_handle: asyncio.TimerHandle | None = None
         """发心跳包定时器的handle"""
+        self._heartbeat_stopped = True
+        """停止发心跳包的标志，定时器回调检查这个标志，而不是cancel定时器"""
+        self._last_send_time = 0.0
+        """上次发送加入房间消息或心跳包的时间，用loop.time()表示"""
 
     @property
     def is_running(self) -> bool:
@@ -156,22 +204,16 @@ class BlivechatClient:
         if self.is_running:
             logger.warning('room=%s is calling close(), but client is running', self._room_key)
 
-        # 如果session是自己创建的则关闭session
-        if self._own_session:
-            await self._session.close()
-
-    async def _send_cmd_data(self, cmd: Command, data: dict):
+    async def _send_bytes(self, data: bytes):
         """
-        发送消息给服务器
+        发送已序列化的消息给服务器
 
-        :param cmd: 消息类型，见Command
-        :param data: 消息体JSON数据
+        :param data: 序列化后的消息
         """
         if self._websocket is None or self._websocket.closed:
             raise ConnectionResetError('websocket is closed')
 
-        body = {'cmd': cmd, 'data': data}
-        await self._websocket.send_json(body)
+        await self._websocket.send_bytes(data)
 
     async def _network_coroutine_wrapper(self):
         """负责处理网络协程的异常，网络协程具体逻辑在_network_coroutine里"""
@@ -197,17 +239,37 @@ class BlivechatClient:
         while True:
             try:
                 # 连接
-                async with self._session.ws_connect(
+                session = self._session if self._session is not None else _get_shared_session()
+                async with session.ws_connect(
                     self._ws_url,
                     receive_timeout=self._heartbeat_interval + 5,
                 ) as websocket:
                     self._websocket = websocket
                     await self._on_ws_connect()
 
-                    # 处理消息
-                    message: aiohttp.WSMessage
-                    async for message in websocket:
-                        self._on_ws_message(message)
+                    # 处理消息，热点路径，先绑定到局部变量
+                    # 直接调用receive()，省去异步迭代器的开销
+                    receive = websocket.receive
+                    text_type = aiohttp.WSMsgType.TEXT
+                    binary_type = aiohttp.WSMsgType.BINARY
+                    close_types = _WS_CLOSE_MSG_TYPES
+                    loads = _loads
+                    handle_command = self._handle_command
+                    on_ws_message = self._on_ws_message
+                    while True:
+                        message = await receive()
+                        message_type = message.type
+                        # 用is比较，比frozenset查找快
+                        if message_type is text_type or message_type is binary_type:
+                            try:
+                                handle_command(loads(message.data))
+                            except Exception:
+                                logger.error('room=%s, body=%s', self._room_key, message.data)
+                                raise
+                        elif message_type in close_types:
+                            break
+                        else:
+                            on_ws_message(message)
                         # 至少成功处理1条消息
                         retry_count = 0
 
@@ -233,43 +295,60 @@ class BlivechatClient:
     async def _on_ws_connect(self):
         """WebSocket连接成功"""
         await self._send_join_room()
-        self._heartbeat_timer_handle = asyncio.get_running_loop().call_later(
-            self._heartbeat_interval, self._on_send_heartbeat
-        )
+        loop = asyncio.get_running_loop()
+        self._last_send_time = loop.time()
+        self._heartbeat_stopped = False
+        # 上次连接的定时器还没触发的话直接复用，不重复创建
+        if self._heartbeat_timer_handle is None:
+            self._heartbeat_timer_handle = loop.call_at(
+                self._last_send_time + self._heartbeat_interval, self._on_send_heartbeat
+            )
 
     async def _on_ws_close(self):
         """WebSocket连接断开"""
-        if self._heartbeat_timer_handle is not None:
-            self._heartbeat_timer_handle.cancel()
-            self._heartbeat_timer_handle = None
+        # 不cancel定时器，避免在事件循环的堆里留下大量已取消的定时器，由回调自己检查标志停止
+        self._heartbeat_stopped = True
+
+    def _make_join_room_bytes(self) -> bytes:
+        """序列化加入房间消息，room_key是不可变的，所以只需要在构造时序列化一次"""
+        return _dumps({
+            'cmd': int(Command.JOIN_ROOM),
+            'data': {
+                'roomKey': {
+                    'type': int(self._room_key.type),
+                    'value': self._room_key.value
+                },
+                # 'config': {
+                #     'autoTranslate': False
+                # }
+            },
+        })
 
     async def _send_join_room(self):
         """发送加入房间消息"""
-        await self._send_cmd_data(Command.JOIN_ROOM, {
-            'roomKey': {
-                'type': self._room_key.type,
-                'value': self._room_key.value
-            },
-            # 'config': {
-            #     'autoTranslate': False
-            # }
-        })
+        await self._send_bytes(self._join_room_bytes)
 
     def _on_send_heartbeat(self):
         """定时发送心跳包的回调"""
-        if self._websocket is None or self._websocket.closed:
+        if self._heartbeat_stopped or self._websocket is None or self._websocket.closed:
             self._heartbeat_timer_handle = None
             return
 
-        self._heartbeat_timer_handle = asyncio.get_running_loop().call_later(
-            self._heartbeat_interval, self._on_send_heartbeat
-        )
-        asyncio.create_task(self._send_heartbeat())
+        # 距离上次发送已经超过间隔时间才发心跳包，否则等到间隔时间再检查
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        next_time = self._last_send_time + self._heartbeat_interval
+        if next_time <= now:
+            self._last_send_time = now
+            asyncio.create_task(self._send_heartbeat())
+            # 事件循环繁忙导致回调延迟时，从现在开始计算下一次，不补发错过的心跳包
+            next_time = now + self._heartbeat_interval
+        self._heartbeat_timer_handle = loop.call_at(next_time, self._on_send_heartbeat)
 
     async def _send_heartbeat(self):
         """发送心跳包"""
         try:
-            await self._send_cmd_data(Command.HEARTBEAT, {})
+            await self._send_bytes(_HEARTBEAT_BYTES)
         except (ConnectionResetError, aiohttp.ClientConnectionError) as e:
             logger.warning('room=%s _send_heartbeat() failed: %r', self._room_key, e)
         except Exception:  # noqa
@@ -277,21 +356,12 @@ class BlivechatClient:
 
     def _on_ws_message(self, message: aiohttp.WSMessage):
         """
-        收到WebSocket消息
+        收到不带消息内容的WebSocket消息，带消息内容的在_network_coroutine里处理
 
         :param message: WebSocket消息
         """
-        if message.type != aiohttp.WSMsgType.TEXT:
-            logger.warning('room=%s unknown websocket message type=%s, data=%s', self._room_key,
-                           message.type, message.data)
-            return
-
-        try:
-            body = json.loads(message.data)
-            self._handle_command(body)
-        except Exception:
-            logger.error('room=%s, body=%s', self._room_key, message.data)
-            raise
+        logger.warning('room=%s unknown websocket message type=%s, data=%s', self._room_key,
+                       message.type, message.data)
 
     def _handle_command(self, command: dict):
         """
@@ -306,6 +376,6 @@ class BlivechatClient:
                 logger.exception('room=%s _handle_command() failed, command=%s', self._room_key, command, exc_info=e)
 
         cmd = command['cmd']
-        if cmd == Command.FATAL_ERROR:
+        if cmd == _FATAL_ERROR_INT:
             body = command['data']
             raise FatalError(body['type'], body['msg'])
@@ -12,8 +12,9 @@ __all__ = (
 
 logger = logging.getLogger('blivedm')
 
-logged_unknown_cmds = set()
-"""已打日志的未知cmd"""
+_logged_unknown_cmd_mask = 0
+"""已打日志的未知cmd，第i位表示cmd=i。很大的cmd共用最高位，避免服务器发送很大的cmd导致整数无限增长"""
+_LOGGED_UNKNOWN_CMD_MAX_BIT = 63
 
 
 class HandlerInterface:
@@ -26,54 +27,80 @@ class HandlerInterface:
         """当客户端停止时调用。可以在这里close或者重新start"""
 
 
-def _make_msg_callback(method_name, message_cls):
-    def callback(self: 'BaseHandler', client: cli.BlivechatClient, command: dict):
-        method = getattr(self, method_name)
-        return method(client, message_cls.from_command(command['data']))
-    return callback
+def _on_unknown_cmd(client: cli.BlivechatClient, command: dict):
+    global _logged_unknown_cmd_mask
+    cmd = command['cmd']
+    if not isinstance(cmd, int) or cmd < 0:
+        # 不合法的cmd不记录到掩码里，每次都打日志
+        logger.warning('room=%s invalid cmd=%r, command=%s', client.room_key, cmd, command)
+        return
+
+    # 只有第一次遇到未知cmd时打日志
+    bit = min(cmd, _LOGGED_UNKNOWN_CMD_MAX_BIT)
+    if not (_logged_unknown_cmd_mask >> bit) & 1:
+        logger.warning('room=%s unknown cmd=%s, command=%s', client.room_key, cmd, command)
+        _logged_unknown_cmd_mask |= 1 << bit
+
+
+_UNKNOWN_CMD = object()
+"""回调数组里未知cmd的占位符，None表示已知的cmd但是忽略"""
+
+
+def _make_callback_array(callback_dict: dict[int, tuple[Callable[[Any], Any], str] | None]) -> list:
+    """cmd是连续的小整数，用数组代替dict，未知的cmd对应_UNKNOWN_CMD"""
+    res = [_UNKNOWN_CMD] * (max(callback_dict) + 1)
+    for cmd, callback in callback_dict.items():
+        res[cmd] = callback
+    return res
 
 
 class BaseHandler(HandlerInterface):
     """一个简单的消息处理器实现，带消息分发和消息类型转换。继承并重写_on_xxx方法即可实现自己的处理器"""
 
-    _CMD_CALLBACK_DICT: dict[
-        int,
-        Callable[
-            ['BaseHandler', cli.BlivechatClient, dict],
-            Any
-        ] | None
-    ] = {
+    _CMD_CALLBACK_ARR: list[tuple[Callable[[Any], Any], str] | None] = _make_callback_array({
         # 收到心跳包
-        cli.Command.HEARTBEAT: _make_msg_callback('_on_heartbeat', models.HeartbeatMsg),
+        cli.Command.HEARTBEAT: (models.HeartbeatMsg.from_command, '_on_heartbeat'),
         # 收到弹幕
-        cli.Command.ADD_TEXT: _make_msg_callback('_on_add_text', models.AddTextMsg),
+        cli.Command.ADD_TEXT: (models.AddTextMsg.from_command, '_on_add_text'),
         # 有人送礼
-        cli.Command.ADD_GIFT: _make_msg_callback('_on_add_gift', models.AddGiftMsg),
+        cli.Command.ADD_GIFT: (models.AddGiftMsg.from_command, '_on_add_gift'),
         # 有人上舰
-        cli.Command.ADD_MEMBER: _make_msg_callback('_on_add_member', models.AddMemberMsg),
+        cli.Command.ADD_MEMBER: (models.AddMemberMsg.from_command, '_on_add_member'),
         # 醒目留言
-        cli.Command.ADD_SUPER_CHAT: _make_msg_callback('_on_add_super_chat', models.AddSuperChatMsg),
+        cli.Command.ADD_SUPER_CHAT: (models.AddSuperChatMsg.from_command, '_on_add_super_chat'),
         # 删除醒目留言
-        cli.Command.DEL_SUPER_CHAT: _make_msg_callback('_on_del_super_chat', models.DelSuperChatMsg),
+        cli.Command.DEL_SUPER_CHAT: (models.DelSuperChatMsg.from_command, '_on_del_super_chat'),
         # 更新翻译
-        cli.Command.UPDATE_TRANSLATION: _make_msg_callback('_on_update_translation', models.UpdateTranslationMsg),
-        # 删除醒目留言
-        cli.Command.FATAL_ERROR: _make_msg_callback('_on_fatal_error', models.FatalErrorMsg),
-    }
-    """cmd -> 处理回调"""
+        cli.Command.UPDATE_TRANSLATION: (models.UpdateTranslationMsg.from_command, '_on_update_translation'),
+        # 致命错误
+        cli.Command.FATAL_ERROR: (models.FatalErrorMsg.from_command, '_on_fatal_error'),
+    })
+    """cmd -> (解析消息函数, 处理方法名)，索引是cmd。值为None表示忽略这个cmd，未知的cmd为_UNKNOWN_CMD"""
+
+    _dispatch: list[tuple[Callable[[Any], Any], Callable] | None] | None = None
+    """cmd -> (解析消息函数, 绑定的处理方法)，第一次处理消息时由_CMD_CALLBACK_ARR生成"""
+
+    def _bind_dispatch(self):
+        return [
+            callback if callback is None or callback is _UNKNOWN_CMD else (callback[0], getattr(self, callback[1]))
+            for callback in self._CMD_CALLBACK_ARR
+        ]
 
     def handle(self, client: cli.BlivechatClient, command: dict):
+        dispatch = self._dispatch
+        if dispatch is None:
+            dispatch = self._dispatch = self._bind_dispatch()
+
         cmd = command['cmd']
-        if cmd not in self._CMD_CALLBACK_DICT:
-            # 只有第一次遇到未知cmd时打日志
-            if cmd not in logged_unknown_cmds:
-                logger.warning('room=%s unknown cmd=%s, command=%s', client.room_key, cmd, command)
-                logged_unknown_cmds.add(cmd)
+        item = dispatch[cmd] if isinstance(cmd, int) and 0 <= cmd < len(dispatch) else _UNKNOWN_CMD
+        if item is None:
+            return
+        if item is _UNKNOWN_CMD:
+            _on_unknown_cmd(client, command)
             return
 
-        callback = self._CMD_CALLBACK_DICT[cmd]
-        if callback is not None:
-            callback(self, client, command)
+        parser, method = item
+        method(client, parser(command['data']))
 
     def _on_heartbeat(self, client: cli.BlivechatClient, message: models.HeartbeatMsg):
         """收到心跳包"""
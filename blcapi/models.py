@@ -3,7 +3,7 @@ import dataclasses
 import enum
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class HeartbeatMsg:
     """心跳消息"""
 
@@ -39,7 +39,11 @@ class ContentType(enum.IntEnum):
     EMOTICON = 1
 
 
-@dataclasses.dataclass
+# 和普通int比较，比和IntEnum比较快
+_EMOTICON_INT = int(ContentType.EMOTICON)
+
+
+@dataclasses.dataclass(slots=True)
 class AddTextMsg:
     """弹幕消息"""
 
@@ -72,35 +76,35 @@ class AddTextMsg:
     content_type: int = ContentType.TEXT.value
     """内容类型，见ContentType"""
     content_type_params: dict | list = dataclasses.field(default_factory=dict)
-    """跟内容类型相关的参数"""
+    """跟内容类型相关的参数，保存服务器发来的原始数据，表情URL用emoticon_url获取"""
 
     @classmethod
     def from_command(cls, data: list):
-        content_type = data[13]
-        content_type_params = data[14]
-        if content_type == ContentType.EMOTICON:
-            content_type_params = {'url': content_type_params[0]}
-
+        # 一次解包比逐个下标访问快，多出来的字段忽略
+        (
+            avatar_url, timestamp, author_name, author_type, content, privilege_type, is_gift_danmaku,
+            author_level, is_newbie, is_mobile_verified, medal_level, id_, translation, content_type,
+            content_type_params, *_
+        ) = data
+        # 按字段顺序传位置参数
         return cls(
-            avatar_url=data[0],
-            timestamp=data[1],
-            author_name=data[2],
-            author_type=data[3],
-            content=data[4],
-            privilege_type=data[5],
-            is_gift_danmaku=bool(data[6]),
-            author_level=data[7],
-            is_newbie=bool(data[8]),
-            is_mobile_verified=bool(data[9]),
-            medal_level=data[10],
-            id=data[11],
-            translation=data[12],
-            content_type=content_type,
-            content_type_params=content_type_params,
+            avatar_url, timestamp, author_name, author_type, content, privilege_type, is_gift_danmaku != 0,
+            author_level, is_newbie != 0, is_mobile_verified != 0, medal_level, id_, translation, content_type,
+            content_type_params,
         )
 
+    @property
+    def emoticon_url(self) -> str:
+        """表情URL，内容类型不是表情时为空字符串"""
+        if self.content_type != _EMOTICON_INT:
+            return ''
+        params = self.content_type_params
+        if isinstance(params, list):
+            return params[0] if params else ''
+        return params.get('url', '')
+
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class AddGiftMsg:
     """礼物消息"""
 
@@ -132,7 +136,7 @@ class AddGiftMsg:
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class AddMemberMsg:
     """上舰消息"""
 
@@ -158,7 +162,7 @@ class AddMemberMsg:
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class AddSuperChatMsg:
     """醒目留言消息"""
 
@@ -190,7 +194,7 @@ class AddSuperChatMsg:
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class DelSuperChatMsg:
     """删除醒目留言消息"""
 
@@ -204,7 +208,7 @@ class DelSuperChatMsg:
         )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class UpdateTranslationMsg:
     """更新内容翻译消息"""
 
@@ -225,7 +229,7 @@ class FatalErrorType(enum.IntEnum):
     AUTH_CODE_ERROR = 1
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FatalErrorMsg:
     """致命错误消息"""
 
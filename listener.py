@@ -14,6 +14,13 @@ logger = logging.getLogger(__name__)
 _live_client: blc_client.BlivechatClient | None = None
 _live_msg_handler: Optional['LiveMsgHandler'] = None
 
+_GUARD_NAMES = {
+    blc_models.GuardLevel.LV1: '舰长',
+    blc_models.GuardLevel.LV2: '提督',
+    blc_models.GuardLevel.LV3: '总督',
+}
+"""舰队等级 -> 名称"""
+
 
 def init():
     global _live_client, _live_msg_handler
@@ -28,6 +35,16 @@ def init():
     _live_client.start()
 
 
+async def shutdown():
+    global _live_client
+    if _live_client is None:
+        return
+    # 先去掉处理器，否则停止时on_client_stopped会重新启动客户端
+    _live_client.set_handler(None)
+    await _live_client.stop_and_close()
+    _live_client = None
+
+
 class LiveMsgHandler(blcapi.BaseHandler):
     def on_client_stopped(self, client: blcapi.BlivechatClient, exception: Exception | None):
         if isinstance(exception, blc_client.FatalError):
@@ -42,14 +59,7 @@ class LiveMsgHandler(blcapi.BaseHandler):
         tts.say(f'{message.author_name} 赠送了{message.num}个{message.gift_name}')
 
     def _on_add_member(self, client: blcapi.BlivechatClient, message: blc_models.AddMemberMsg):
-        if message.privilege_type == blc_models.GuardLevel.LV1:
-            guard_name = '舰长'
-        elif message.privilege_type == blc_models.GuardLevel.LV2:
-            guard_name = '提督'
-        elif message.privilege_type == blc_models.GuardLevel.LV3:
-            guard_name = '总督'
-        else:
-            guard_name = '未知舰队等级'
+        guard_name = _GUARD_NAMES.get(message.privilege_type, '未知舰队等级')
         tts.say(f'{message.author_name} 购买了{guard_name}')
 
     def _on_add_super_chat(self, client: blcapi.BlivechatClient, message: blc_models.AddSuperChatMsg):
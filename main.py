@@ -3,6 +3,7 @@ import asyncio
 import logging
 import sys
 
+import blcapi
 import config
 import listener
 import tts
@@ -13,7 +14,10 @@ logger = logging.getLogger(__name__)
 async def main():
     if not init():
         return 1
-    await run()
+    try:
+        await run()
+    finally:
+        await shutdown()
     return 0
 
 
@@ -40,5 +44,23 @@ async def run():
     await asyncio.Event().wait()
 
 
+async def shutdown():
+    # 先停止客户端，再关闭客户端共用的连接池
+    await listener.shutdown()
+    await blcapi.close_shared_session()
+
+
+def run_main():
+    # uvloop不支持Windows，没安装时使用默认的事件循环
+    if sys.platform != 'win32':
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.run(main())
+    return asyncio.run(main())
+
+
 if __name__ == '__main__':
-    sys.exit(asyncio.run(main()))
+    sys.exit(run_main())
@@ -33,6 +33,14 @@ def init():
 
 
 def say(text, priority: Priority = Priority.NORMAL):
+    """
+    把文本推到朗读队列，由TTS工作线程朗读。不会阻塞，可以直接在事件循环里调用
+
+    :param text: 要朗读的文本
+    :param priority: 优先级
+    :return: 是否成功推到队列。普通优先级的队列满时丢弃任务，返回False；
+        高优先级的队列满时挤掉普通优先级的任务，总是返回True
+    """
     logger.info('%s', text)
     task = TtsTask(priority=priority, text=text)
     res = _tts.push_task(task)